@@ -1,20 +1,32 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from functools import lru_cache
 from typing import Optional
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 class Settings(BaseSettings):
     DATABASE_URL: str = Field(..., env="DATABASE_URL")
     QDRANT_URL: str = Field(..., env="QDRANT_URL")
     EMBEDDING_MODEL: str = Field("all-MiniLM-L6-v2", env="EMBEDDING_MODEL")
+    # Directory written by scripts/export_minilm_onnx.py; uses ONNX Runtime when set
+    ONNX_MODEL_DIR: Optional[str] = Field(None, env="ONNX_MODEL_DIR")
+    EMBEDDING_NUM_THREADS: Optional[int] = Field(None, env="EMBEDDING_NUM_THREADS")
     QDRANT_COLLECTION: str = Field("tools", env="QDRANT_COLLECTION")
     API_PREFIX: str = Field("/api/v1", env="API_PREFIX")
+    SKIP_DB_INIT: bool = Field(False, env="SKIP_DB_INIT")
+    # Connection budget shared by all worker processes
+    DB_POOL_SIZE: int = Field(10, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(20, env="DB_MAX_OVERFLOW")
+    WEB_CONCURRENCY: int = Field(1, env="WEB_CONCURRENCY")
     
     class Config:
         case_sensitive = True
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Load settings once from the environment and .env file
+    """
+    return Settings()
+
+settings = get_settings()
\ No newline at end of file
@@ -1,9 +1,13 @@
+from sqlalchemy import Integer, Row, cast, column, exists, func, insert, literal, select, update, tuple_
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app import models, schemas
-from app.vector_db import upsert_tool, delete_tool
+from app.vector_db import delete_tool
 import logging
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import base64
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +21,25 @@ def get_tool(db: Session, tool_id: int) -> Optional[models.Tool]:
         logger.error(f"Error getting tool {tool_id}: {e}")
         return None
 
+def tool_exists_bulk(db: Session, ids: Iterable[int]) -> Set[int]:
+    """
+    Get the subset of tool IDs that exist, selecting only the id column
+    """
+    ids = {tool_id for tool_id in ids if tool_id}
+    if not ids:
+        return set()
+    return {row.id for row in db.query(models.Tool.id).filter(models.Tool.id.in_(ids)).all()}
+
+def get_tool_descriptions(db: Session, ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Get descriptions of the tools that exist among the given IDs
+    """
+    ids = {tool_id for tool_id in ids if tool_id}
+    if not ids:
+        return {}
+    rows = db.query(models.Tool.id, models.Tool.description).filter(models.Tool.id.in_(ids)).all()
+    return {row.id: row.description for row in rows}
+
 def get_tool_by_name(db: Session, name: str) -> Optional[models.Tool]:
     """
     Get tool by name
@@ -37,29 +60,20 @@ def get_tools(db: Session, skip: int = 0, limit: int = 100) -> List[models.Tool]
         logger.error(f"Error getting tools: {e}")
         return []
 
-def create_tool(db: Session, tool: schemas.ToolCreate) -> Optional[models.Tool]:
+def create_tool_row(db: Session, tool: schemas.ToolCreate) -> Optional[models.Tool]:
     """
-    Create a new tool
+    Create a new tool in the database only
     """
     try:
-        db_tool = models.Tool(
-            name=tool.name,
-            description=tool.description,
-            tags=tool.tags,
-            tool_metadata=tool.tool_metadata
-        )
-        db.add(db_tool)
+        db_tool = db.execute(
+            insert(models.Tool).values(
+                name=tool.name,
+                description=tool.description,
+                tags=tool.tags,
+                tool_metadata=tool.tool_metadata
+            ).returning(models.Tool)
+        ).scalar_one()
         db.commit()
-        db.refresh(db_tool)
-        
-        # Also add to vector database
-        if not upsert_tool(
-            tool_id=db_tool.id,
-            name=db_tool.name,
-            description=db_tool.description,
-            tags=db_tool.tags
-        ):
-            logger.warning(f"Failed to upsert tool {db_tool.id} to vector database")
         
         logger.info(f"Created tool {db_tool.id}: {db_tool.name}")
         return db_tool
@@ -72,32 +86,53 @@ def create_tool(db: Session, tool: schemas.ToolCreate) -> Optional[models.Tool]:
         logger.error(f"Error creating tool: {e}")
         return None
 
-def update_tool(db: Session, tool_id: int, tool: schemas.ToolUpdate) -> Optional[models.Tool]:
+def bulk_create_tools(db: Session, tools: List[schemas.ToolCreate], batch_size: int = 1000) -> List[models.Tool]:
     """
-    Update an existing tool
+    Insert many tools with one statement per batch, skipping names that already exist.
+    Only the inserted tools are returned; nothing is written to the vector database.
     """
+    db_tools = []
     try:
-        db_tool = db.query(models.Tool).filter(models.Tool.id == tool_id).first()
+        for start in range(0, len(tools), batch_size):
+            batch = tools[start:start + batch_size]
+            db_tools.extend(db.scalars(
+                pg_insert(models.Tool).values([
+                    {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "tags": tool.tags,
+                        "tool_metadata": tool.tool_metadata
+                    }
+                    for tool in batch
+                ]).on_conflict_do_nothing(index_elements=["name"]).returning(models.Tool)
+            ).all())
+        db.commit()
+        
+        logger.info(f"Created {len(db_tools)} of {len(tools)} tools")
+        return db_tools
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error bulk creating tools: {e}")
+        return []
+
+def update_tool_row(db: Session, tool_id: int, tool: schemas.ToolUpdate) -> Optional[models.Tool]:
+    """
+    Update an existing tool in the database only
+    """
+    try:
+        db_tool = db.execute(
+            update(models.Tool).where(models.Tool.id == tool_id).values(
+                name=tool.name,
+                description=tool.description,
+                tags=tool.tags,
+                tool_metadata=tool.tool_metadata
+            ).returning(models.Tool)
+        ).scalar_one_or_none()
         if not db_tool:
             logger.error(f"Tool {tool_id} not found for update")
             return None
         
-        db_tool.name = tool.name
-        db_tool.description = tool.description
-        db_tool.tags = tool.tags
-        db_tool.tool_metadata = tool.tool_metadata
-        
         db.commit()
-        db.refresh(db_tool)
-        
-        # Update vector database
-        if not upsert_tool(
-            tool_id=db_tool.id,
-            name=db_tool.name,
-            description=db_tool.description,
-            tags=db_tool.tags
-        ):
-            logger.warning(f"Failed to upsert tool {db_tool.id} to vector database during update")
         
         logger.info(f"Updated tool {db_tool.id}: {db_tool.name}")
         return db_tool
@@ -134,19 +169,23 @@ def delete_tool_db(db: Session, tool_id: int) -> bool:
         logger.error(f"Error deleting tool {tool_id}: {e}")
         return False
 
-def create_search_history(db: Session, query: str, results: list) -> Optional[models.SearchHistory]:
+def create_search_history(
+    db: Session,
+    query: str,
+    results: list,
+    validated: bool = False
+) -> Optional[models.SearchHistory]:
     """
-    Create search history record with only valid tools
+    Create search history record with only valid tools.
+    Pass validated=True when the results were already checked against the database.
     """
     try:
         # Filter out results for tools that no longer exist
-        valid_results = []
-        for result in results:
-            tool_id = result.get('id')
-            if tool_id and get_tool(db, tool_id):
-                valid_results.append(result)
+        if not validated:
+            live = tool_exists_bulk(db, (r.get('id') for r in results))
+            results = [r for r in results if r.get('id') in live]
         
-        db_history = models.SearchHistory(query=query, results=valid_results)
+        db_history = models.SearchHistory(query=query, results=results)
         db.add(db_history)
         db.commit()
         db.refresh(db_history)
@@ -158,25 +197,66 @@ def create_search_history(db: Session, query: str, results: list) -> Optional[mo
         logger.error(f"Error creating search history: {e}")
         return None
 
-def get_search_history(db: Session, skip: int = 0, limit: int = 10) -> List[models.SearchHistory]:
+def encode_history_cursor(history_item: Row) -> str:
+    """
+    Encode the keyset position of a search history record
+    """
+    raw = f"{history_item.created_at.isoformat()}|{history_item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
     """
-    Get paginated search history with only valid tools
+    Decode a search history cursor into (created_at, id), or None if invalid
     """
     try:
-        history_items = db.query(models.SearchHistory).order_by(
-            models.SearchHistory.created_at.desc()
-        ).offset(skip).limit(limit).all()
+        created_at, history_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(history_id)
+    except Exception:
+        return None
+
+def get_search_history(
+    db: Session,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[Tuple[datetime, int]] = None
+) -> List[Row]:
+    """
+    Get paginated search history with only valid tools.
+    With a cursor, returns the records after that (created_at, id) position.
+    """
+    try:
+        # Select the page first so the results filter only runs on its rows
+        page = db.query(models.SearchHistory).order_by(
+            models.SearchHistory.created_at.desc(),
+            models.SearchHistory.id.desc()
+        )
+        if cursor:
+            page = page.filter(
+                tuple_(models.SearchHistory.created_at, models.SearchHistory.id) < tuple_(*cursor)
+            )
+        else:
+            page = page.offset(skip)
+        page = page.limit(limit).subquery("page")
         
-        # Filter out deleted tools from search history results
-        for history_item in history_items:
-            valid_results = []
-            for result in history_item.results:
-                tool_id = result.get('id')
-                if tool_id and get_tool(db, tool_id):
-                    valid_results.append(result)
-            history_item.results = valid_results
+        # Unnest each results array and keep the entries whose tool still exists
+        result = func.jsonb_array_elements(page.c.results).table_valued(
+            column("value", JSONB), with_ordinality="ordinality"
+        ).alias("result")
+        valid_results = select(
+            func.coalesce(
+                func.jsonb_agg(aggregate_order_by(result.c.value, result.c.ordinality)),
+                cast(literal("[]"), JSONB)
+            )
+        ).where(
+            exists().where(models.Tool.id == result.c.value["id"].astext.cast(Integer))
+        ).scalar_subquery()
         
-        return history_items
-    except Exception as e:
+        return db.query(
+            page.c.id,
+            page.c.query,
+            valid_results.label("results"),
+            page.c.created_at
+        ).order_by(page.c.created_at.desc(), page.c.id.desc()).all()
+    except SQLAlchemyError as e:
         logger.error(f"Error getting search history: {e}")
-        return []
\ No newline at end of file
+        raise
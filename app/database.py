@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 from app.config import settings
@@ -7,18 +8,25 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Split the connection budget across worker processes so that
+# workers * (pool_size + max_overflow) <= postgres max_connections - reserved
+workers = max(1, settings.WEB_CONCURRENCY)
+
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_size=20,
-    max_overflow=10,
+    pool_size=max(1, settings.DB_POOL_SIZE // workers),
+    max_overflow=max(0, settings.DB_MAX_OVERFLOW // workers),
     pool_timeout=30,
     pool_recycle=1800,
+    pool_pre_ping=True,
+    pool_use_lifo=True,
     echo=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory; objects stay loaded after commit so RETURNING
+# results don't trigger a reload
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 def get_db() -> Session: # type: ignore
     """
@@ -36,30 +44,29 @@ def get_db() -> Session: # type: ignore
 
 def init_db():
     """
-    Initialize database tables
+    Create database tables and indexes that don't exist yet
     """
     try:
-        Base.metadata.drop_all(bind=engine)  # Added this line to drop all tables first
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=engine, checkfirst=True)
         logger.info("Database tables created successfully!")
         
-        # Reset sequences after table creation
-        reset_sequences()
+        migrate_search_history_results()
+        
+        # create_all skips existing tables, including indexes added to them later
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
         raise
 
-def reset_sequences():
+def migrate_search_history_results():
     """
-    Reset PostgreSQL sequences to start from 1
+    Convert search_history.results from JSON to JSONB on databases created before the switch
     """
-    try:
-        with engine.connect() as conn:
-            # Reset tools table sequence
-            conn.execute(text("ALTER SEQUENCE tools_id_seq RESTART WITH 1"))
-            # Reset search_history table sequence
-            conn.execute(text("ALTER SEQUENCE search_history_id_seq RESTART WITH 1"))
-            conn.commit()
-        logger.info("Database sequences reset successfully!")
-    except Exception as e:
-        logger.error(f"Error resetting sequences: {e}")
\ No newline at end of file
+    columns = {c["name"]: c["type"] for c in inspect(engine).get_columns("search_history")}
+    if isinstance(columns["results"], JSONB):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE search_history ALTER COLUMN results TYPE jsonb USING results::jsonb"))
+    logger.info("Converted search_history.results to JSONB")
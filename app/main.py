@@ -1,14 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from app import crud, schemas, models
-from app.database import get_db, init_db
+from app.database import get_db, init_db, SessionLocal
 from app.config import settings
-from app.vector_db import search_tools
-from fastapi.responses import JSONResponse
+from app.vector_db import search_tools, search_tools_batch, embed_tool, aupsert_tool
+from fastapi.responses import JSONResponse, Response
 
 # Set up logging
 logging.basicConfig(
@@ -21,9 +23,12 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize database
-    logger.info("Initializing database...")
-    init_db()
-    logger.info("Database initialized successfully!")
+    if settings.SKIP_DB_INIT:
+        logger.info("Skipping database initialization (SKIP_DB_INIT is set)")
+    else:
+        logger.info("Initializing database...")
+        init_db()
+        logger.info("Database initialized successfully!")
     yield
     # Shutdown: Clean up resources
     logger.info("Shutting down application...")
@@ -50,16 +55,34 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.post(f"{settings.API_PREFIX}/tools", response_model=schemas.ToolResponse, status_code=status.HTTP_201_CREATED, tags=["Tools"])
-def create_tool(tool: schemas.ToolCreate, db: Session = Depends(get_db)):
+async def create_tool(
+    tool: schemas.ToolCreate,
+    wait: bool = Query(False, description="Wait for the vector index to apply the write"),
+    db: Session = Depends(get_db)
+):
     """
     Create a new tool
     """
-    db_tool = crud.create_tool(db, tool)
+    # Embed the tool while the row is being written
+    db_tool, embedding = await asyncio.gather(
+        run_in_threadpool(crud.create_tool_row, db, tool),
+        run_in_threadpool(embed_tool, tool.name, tool.description, tool.tags)
+    )
     if not db_tool:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Tool with this name already exists"
         )
+    
+    if embedding is None or not await aupsert_tool(
+        tool_id=db_tool.id,
+        name=db_tool.name,
+        description=db_tool.description,
+        tags=db_tool.tags,
+        embedding=embedding,
+        wait=wait
+    ):
+        logger.warning(f"Failed to upsert tool {db_tool.id} to vector database")
     return db_tool
 
 @app.get(f"{settings.API_PREFIX}/tools", response_model=List[schemas.ToolResponse], tags=["Tools"])
@@ -88,16 +111,42 @@ def read_tool(tool_id: int, db: Session = Depends(get_db)):
     return db_tool
 
 @app.put(f"{settings.API_PREFIX}/tools/{{tool_id}}", response_model=schemas.ToolResponse, tags=["Tools"])
-def update_tool(tool_id: int, tool: schemas.ToolUpdate, db: Session = Depends(get_db)):
+async def update_tool(
+    tool_id: int,
+    tool: schemas.ToolUpdate,
+    wait: bool = Query(False, description="Wait for the vector index to apply the write"),
+    db: Session = Depends(get_db)
+):
     """
     Update an existing tool
     """
-    db_tool = crud.update_tool(db, tool_id, tool)
+    # Don't pay for an embedding when there is nothing to update
+    if not await run_in_threadpool(crud.tool_exists_bulk, db, [tool_id]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tool not found"
+        )
+    
+    # Embed the tool while the row is being written
+    db_tool, embedding = await asyncio.gather(
+        run_in_threadpool(crud.update_tool_row, db, tool_id, tool),
+        run_in_threadpool(embed_tool, tool.name, tool.description, tool.tags)
+    )
     if not db_tool:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tool not found or name already exists"
         )
+    
+    if embedding is None or not await aupsert_tool(
+        tool_id=db_tool.id,
+        name=db_tool.name,
+        description=db_tool.description,
+        tags=db_tool.tags,
+        embedding=embedding,
+        wait=wait
+    ):
+        logger.warning(f"Failed to upsert tool {db_tool.id} to vector database during update")
     return db_tool
 
 @app.delete(f"{settings.API_PREFIX}/tools/{{tool_id}}", tags=["Tools"])
@@ -112,39 +161,98 @@ def delete_tool_endpoint(tool_id: int, db: Session = Depends(get_db)):
         )
     return {"message": "Tool deleted successfully"}
 
+def save_search_history(query: str, results: list):
+    """
+    Record a search in its own session, outside the request.
+    The results were already checked against the database by the handler.
+    """
+    db = SessionLocal()
+    try:
+        crud.create_search_history(db, query, results, validated=True)
+    finally:
+        db.close()
+
 @app.post(f"{settings.API_PREFIX}/search", response_model=schemas.SearchResponse, tags=["Search"])
-def semantic_search(query: schemas.SearchQuery, db: Session = Depends(get_db)):
+def semantic_search(
+    query: schemas.SearchQuery,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """
     Perform semantic search for tools
     """
     # Perform semantic search
     search_results = search_tools(query.query, query.limit)
     
-    # Filter out tools that don't exist in the database
-    valid_results = []
-    for result in search_results:
-        tool_id = result.get('id')
-        if tool_id and crud.get_tool(db, tool_id):
-            valid_results.append(result)
+    # Filter out tools that don't exist in the database and add their descriptions
+    descriptions = crud.get_tool_descriptions(db, (r.get('id') for r in search_results))
+    valid_results = [
+        {**r, "description": descriptions[r['id']]}
+        for r in search_results if r.get('id') in descriptions
+    ]
     
-    # Save search history to database (only valid results)
-    crud.create_search_history(db, query.query, valid_results)
+    # Save search history to database (only valid results) after responding
+    background_tasks.add_task(save_search_history, query.query, valid_results)
     
     return {
         "query": query.query,
         "results": valid_results
     }
 
+@app.post(f"{settings.API_PREFIX}/search/bulk", response_model=List[schemas.SearchResponse], tags=["Search"])
+def bulk_semantic_search(
+    query: schemas.BulkSearchQuery,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Perform semantic search for several queries at once
+    """
+    batch_results = search_tools_batch(query.queries, query.limit)
+    
+    # Filter out tools that don't exist in the database and add their descriptions
+    descriptions = crud.get_tool_descriptions(db, (r.get('id') for results in batch_results for r in results))
+    
+    responses = [
+        {
+            "query": q,
+            "results": [
+                {**r, "description": descriptions[r['id']]}
+                for r in results if r.get('id') in descriptions
+            ]
+        }
+        for q, results in zip(query.queries, batch_results)
+    ]
+    
+    # Save search history for each query (only valid results) after responding
+    for response in responses:
+        background_tasks.add_task(save_search_history, response["query"], response["results"])
+    
+    return responses
+
 @app.get(f"{settings.API_PREFIX}/search/history", response_model=List[schemas.SearchHistoryResponse], tags=["Search"])
 def get_search_history(
-    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    skip: int = Query(0, ge=0, description="Number of records to skip (ignored when cursor is given)", deprecated=True),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to return"),
     db: Session = Depends(get_db)
 ):
     """
     Get search history with pagination
     """
-    history = crud.get_search_history(db, skip=skip, limit=limit)
+    position = None
+    if cursor:
+        position = crud.decode_history_cursor(cursor)
+        if not position:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    history = crud.get_search_history(db, skip=skip, limit=limit, cursor=position)
+    if len(history) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_history_cursor(history[-1])
     return history
 
 # Exception handlers
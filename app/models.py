@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import json
@@ -32,9 +33,14 @@ class SearchHistory(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     query = Column(Text, nullable=False)
-    results = Column(JSON, default=[])
+    results = Column(JSONB, default=[])
     created_at = Column(DateTime, default=func.now())
     
+    __table_args__ = (
+        # Newest-first history pages
+        Index("ix_search_history_created_at", created_at.desc(), id.desc()),
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
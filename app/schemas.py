@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, constr, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from typing import Union
@@ -27,6 +27,10 @@ class SearchQuery(BaseModel):
     query: str = Field(..., min_length=1, description="Search query")
     limit: Optional[int] = Field(10, ge=1, le=100, description="Maximum number of results to return")
 
+class BulkSearchQuery(BaseModel):
+    queries: List[constr(min_length=1)] = Field(..., min_length=1, max_length=100, description="Search queries")
+    limit: Optional[int] = Field(10, ge=1, le=100, description="Maximum number of results to return per query")
+
 class SearchResult(BaseModel):
     id: int
     name: str
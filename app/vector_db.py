@@ -1,83 +1,296 @@
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
-from sentence_transformers import SentenceTransformer
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams, QuantizationSearchParams, OptimizersConfigDiff, SearchRequest
+)
 from app.config import settings
+import asyncio
 import logging
-from typing import List, Optional
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
-# Initialize embedding model
-try:
-    model = SentenceTransformer(settings.EMBEDDING_MODEL)
-    EMBEDDING_DIM = model.get_sentence_embedding_dimension()
-    logger.info(f"Loaded embedding model: {settings.EMBEDDING_MODEL} with dimension: {EMBEDDING_DIM}")
-except Exception as e:
-    logger.error(f"Failed to load embedding model: {e}")
-    raise
-
-# Initialize Qdrant client
-try:
-    client = QdrantClient(url=settings.QDRANT_URL, timeout=30)
-    logger.info(f"Connected to Qdrant at {settings.QDRANT_URL}")
-except Exception as e:
-    logger.error(f"Failed to connect to Qdrant: {e}")
-    raise
-
-# Create collection if it doesn't exist
-try:
-    collection_info = client.get_collection(settings.QDRANT_COLLECTION)
-    logger.info(f"Collection {settings.QDRANT_COLLECTION} already exists")
-except Exception:
+# Query embeddings kept in the LRU cache
+EMBEDDING_CACHE_SIZE = 4096
+_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+_embedding_cache_hits = 0
+_embedding_cache_misses = 0
+
+# Segment size (KB) above which Qdrant builds the HNSW index
+INDEXING_THRESHOLD = 20000
+
+# Payload fields returned with search hits
+SEARCH_PAYLOAD_FIELDS = ["tool_id", "name", "tags"]
+
+# Minimum similarity for a search hit
+SCORE_THRESHOLD = 0.3
+
+# Rescore oversampled int8 candidates with the original vectors
+SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+@lru_cache(maxsize=1)
+def get_model():
+    """
+    Load the embedding model on first use
+    """
     try:
-        client.create_collection(
-            collection_name=settings.QDRANT_COLLECTION,
-            vectors_config=VectorParams(
-                size=EMBEDDING_DIM,
-                distance=Distance.COSINE
-            )
-        )
-        logger.info(f"Created collection {settings.QDRANT_COLLECTION} with dimension {EMBEDDING_DIM}")
+        if settings.ONNX_MODEL_DIR:
+            from app.onnx_encoder import OnnxEncoder
+            
+            model = OnnxEncoder(settings.ONNX_MODEL_DIR, num_threads=settings.EMBEDDING_NUM_THREADS or 1)
+            model_name = settings.ONNX_MODEL_DIR
+        else:
+            from sentence_transformers import SentenceTransformer
+            
+            if settings.EMBEDDING_NUM_THREADS:
+                import torch
+                torch.set_num_threads(settings.EMBEDDING_NUM_THREADS)
+            model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            model_name = settings.EMBEDDING_MODEL
+        logger.info(f"Loaded embedding model: {model_name} with dimension: {model.get_sentence_embedding_dimension()}")
+        return model
+    except Exception as e:
+        logger.error(f"Failed to load embedding model: {e}")
+        raise
+
+@lru_cache(maxsize=1)
+def get_client() -> QdrantClient:
+    """
+    Connect to Qdrant on first use, creating the collection if it doesn't exist
+    """
+    try:
+        client = QdrantClient(url=settings.QDRANT_URL, timeout=30)
+        logger.info(f"Connected to Qdrant at {settings.QDRANT_URL}")
     except Exception as e:
-        logger.error(f"Failed to create collection: {e}")
+        logger.error(f"Failed to connect to Qdrant: {e}")
         raise
+    
+    try:
+        client.get_collection(settings.QDRANT_COLLECTION)
+        logger.info(f"Collection {settings.QDRANT_COLLECTION} already exists")
+    except Exception:
+        embedding_dim = get_model().get_sentence_embedding_dimension()
+        try:
+            client.create_collection(
+                collection_name=settings.QDRANT_COLLECTION,
+                vectors_config=VectorParams(
+                    size=embedding_dim,
+                    distance=Distance.COSINE,
+                    on_disk=True  # Originals on disk, int8 copies serve search
+                ),
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(
+                        type=ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True
+                    )
+                ),
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
+            )
+            logger.info(f"Created collection {settings.QDRANT_COLLECTION} with dimension {embedding_dim}")
+        except Exception as e:
+            logger.error(f"Failed to create collection: {e}")
+            raise
+    return client
+
+@lru_cache(maxsize=1)
+def get_async_client() -> AsyncQdrantClient:
+    """
+    Async Qdrant client, created on first use
+    """
+    get_client()  # Make sure the collection exists
+    return AsyncQdrantClient(url=settings.QDRANT_URL, timeout=30)
+
+async def aget_async_client() -> AsyncQdrantClient:
+    """
+    Get the async client; the first call sets it up in a worker thread
+    because get_client() does blocking Qdrant requests
+    """
+    if get_async_client.cache_info().currsize:
+        return get_async_client()
+    return await asyncio.get_running_loop().run_in_executor(None, get_async_client)
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize case and whitespace so equivalent queries share a cache entry
+    """
+    return " ".join(text.lower().split())
 
-def get_embedding(text: str) -> List[float]:
+def get_embeddings(texts: List[str]) -> List[np.ndarray]:
     """
-    Generate embedding for text using the sentence transformer model
+    Generate embeddings for query texts, encoding only the cache misses in one batch.
+    The returned float32 arrays are shared with the cache and read-only.
+    """
+    global _embedding_cache_hits, _embedding_cache_misses
+    keys = [normalize_query(text) for text in texts]
+    with _embedding_cache_lock:
+        embeddings = []
+        for key in keys:
+            embedding = _embedding_cache.get(key)
+            if embedding is not None:
+                _embedding_cache.move_to_end(key)
+                _embedding_cache_hits += 1
+            else:
+                _embedding_cache_misses += 1
+            embeddings.append(embedding)
+    
+    misses = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+    if not misses:
+        return embeddings
+    
+    encoded = get_model().encode(
+        misses,
+        batch_size=64,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+    encoded.setflags(write=False)
+    fresh = dict(zip(misses, encoded))
+    
+    with _embedding_cache_lock:
+        for key, embedding in fresh.items():
+            _embedding_cache[key] = embedding
+            _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    
+    return [fresh[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+
+def get_embedding(text: str) -> np.ndarray:
+    """
+    Generate embedding for text using the embedding model.
+    Results are cached on the whitespace/case-normalized text; the returned
+    float32 array is shared with the cache and read-only.
     """
     try:
-        embedding = model.encode(text, normalize_embeddings=True)
-        return embedding.tolist()
+        embedding = get_embeddings([text])[0]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Embedding cache stats: {get_embedding_cache_stats()}")
+        return embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise
 
-def upsert_tool(tool_id: int, name: str, description: str, tags: List[str]) -> bool:
+def get_embedding_cache_stats() -> dict:
+    """
+    Get hit/miss counters for the embedding cache
+    """
+    with _embedding_cache_lock:
+        hits, misses, size = _embedding_cache_hits, _embedding_cache_misses, len(_embedding_cache)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": size,
+        "hit_rate": hits / lookups if lookups else 0.0
+    }
+
+def tool_text(name: str, description: str, tags: List[str]) -> str:
+    """
+    Build the text that is embedded for a tool
+    """
+    return f"{name} {description} {' '.join(tags or [])}"
+
+def bulk_upsert_tools(items: List[Tuple[int, str, str, List[str]]], parallel: int = 1) -> bool:
+    """
+    Upsert many tool embeddings into vector database.
+    Items are (tool_id, name, description, tags) tuples; all texts are encoded
+    in one batched forward pass and uploaded in batches of 64 points.
+    """
+    if not items:
+        return True
+    try:
+        texts = [tool_text(name, description, tags) for _, name, description, tags in items]
+        embeddings = get_model().encode(
+            texts,
+            batch_size=64,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        
+        get_client().upload_collection(
+            collection_name=settings.QDRANT_COLLECTION,
+            vectors=embeddings,
+            payload=[
+                {
+                    "name": name,
+                    "tags": tags or [],
+                    "tool_id": tool_id
+                }
+                for tool_id, name, description, tags in items
+            ],
+            ids=[tool_id for tool_id, _, _, _ in items],
+            batch_size=64,
+            parallel=parallel,
+            wait=True
+        )
+        
+        logger.info(f"Upserted {len(items)} tools to vector database")
+        return True
+    except Exception as e:
+        logger.error(f"Error bulk upserting tools to vector database: {e}")
+        return False
+
+def embed_tool(name: str, description: str, tags: List[str]) -> Optional[np.ndarray]:
+    """
+    Generate embedding for a tool, returning None on failure
+    """
+    try:
+        embedding = get_model().encode(
+            tool_text(name, description, tags),
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        return embedding.astype(np.float32, copy=False)
+    except Exception as e:
+        logger.error(f"Error generating embedding: {e}")
+        return None
+
+async def aupsert_tool(
+    tool_id: int,
+    name: str,
+    description: str,
+    tags: List[str],
+    embedding: Optional[np.ndarray] = None,
+    wait: bool = False
+) -> bool:
     """
-    Upsert tool embedding into vector database
+    Upsert tool embedding into vector database without blocking the event loop.
+    With wait=False Qdrant acknowledges the write before it is applied.
     """
     try:
-        # Combine text for embedding
-        text = f"{name} {description} {' '.join(tags)}"
-        embedding = get_embedding(text)
+        if embedding is None:
+            embedding = await asyncio.get_running_loop().run_in_executor(
+                None, embed_tool, name, description, tags
+            )
+            if embedding is None:
+                return False
         
         point = PointStruct(
             id=tool_id,
             vector=embedding,
             payload={
                 "name": name,
-                "description": description,
-                "tags": tags,
+                "tags": tags or [],
                 "tool_id": tool_id
             }
         )
         
-        operation_info = client.upsert(
+        client = await aget_async_client()
+        operation_info = await client.upsert(
             collection_name=settings.QDRANT_COLLECTION,
             points=[point],
-            wait=True
+            wait=wait
         )
         
         logger.info(f"Upserted tool {tool_id} to vector database: {operation_info}")
@@ -86,6 +299,47 @@ def upsert_tool(tool_id: int, name: str, description: str, tags: List[str]) -> b
         logger.error(f"Error upserting tool to vector database: {e}")
         return False
 
+def disable_indexing() -> bool:
+    """
+    Pause HNSW indexing, e.g. before a bulk load
+    """
+    try:
+        get_client().update_collection(
+            collection_name=settings.QDRANT_COLLECTION,
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=0)
+        )
+        logger.info(f"Disabled indexing for collection {settings.QDRANT_COLLECTION}")
+        return True
+    except Exception as e:
+        logger.error(f"Error disabling indexing: {e}")
+        return False
+
+def enable_indexing() -> bool:
+    """
+    Resume HNSW indexing; Qdrant builds the index in the background
+    """
+    try:
+        get_client().update_collection(
+            collection_name=settings.QDRANT_COLLECTION,
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
+        )
+        logger.info(f"Enabled indexing for collection {settings.QDRANT_COLLECTION}")
+        return True
+    except Exception as e:
+        logger.error(f"Error enabling indexing: {e}")
+        return False
+
+def _format_results(search_result) -> List[dict]:
+    return [
+        {
+            "id": r.payload["tool_id"],
+            "name": r.payload["name"],
+            "tags": r.payload.get("tags") or [],
+            "score": r.score
+        }
+        for r in search_result
+    ]
+
 def search_tools(query: str, limit: int = 10) -> List[dict]:
     """
     Search for tools using semantic similarity
@@ -93,23 +347,16 @@ def search_tools(query: str, limit: int = 10) -> List[dict]:
     try:
         query_embedding = get_embedding(query)
         
-        search_result = client.search(
+        search_result = get_client().search(
             collection_name=settings.QDRANT_COLLECTION,
-            query_vector=query_embedding,
+            query_vector=query_embedding.copy(),  # The cached array is read-only; don't hand it out for mutation
             limit=limit,
-            with_payload=True,
-            score_threshold=0.3  # Minimum similarity threshold
+            with_payload=SEARCH_PAYLOAD_FIELDS,
+            score_threshold=SCORE_THRESHOLD,
+            search_params=SEARCH_PARAMS
         )
         
-        results = []
-        for result in search_result:
-            results.append({
-                "id": result.payload["tool_id"],
-                "name": result.payload["name"],
-                "description": result.payload["description"],
-                "tags": result.payload.get("tags", []),
-                "score": result.score
-            })
+        results = _format_results(search_result)
         
         logger.info(f"Semantic search for '{query}' returned {len(results)} results")
         return results
@@ -117,12 +364,41 @@ def search_tools(query: str, limit: int = 10) -> List[dict]:
         logger.error(f"Error searching tools: {e}")
         return []
 
+def search_tools_batch(queries: List[str], limit: int = 10) -> List[List[dict]]:
+    """
+    Search for tools for several queries in a single request
+    """
+    try:
+        embeddings = get_embeddings(queries)
+        
+        batch_result = get_client().search_batch(
+            collection_name=settings.QDRANT_COLLECTION,
+            requests=[
+                SearchRequest(
+                    vector=embedding,
+                    limit=limit,
+                    with_payload=SEARCH_PAYLOAD_FIELDS,
+                    score_threshold=SCORE_THRESHOLD,
+                    params=SEARCH_PARAMS
+                )
+                for embedding in embeddings
+            ]
+        )
+        
+        results = [_format_results(search_result) for search_result in batch_result]
+        
+        logger.info(f"Batch semantic search for {len(queries)} queries returned {sum(map(len, results))} results")
+        return results
+    except Exception as e:
+        logger.error(f"Error batch searching tools: {e}")
+        return [[] for _ in queries]
+
 def delete_tool(tool_id: int) -> bool:
     """
     Delete tool from vector database
     """
     try:
-        operation_info = client.delete(
+        operation_info = get_client().delete(
             collection_name=settings.QDRANT_COLLECTION,
             points_selector=[tool_id]
         )
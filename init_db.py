@@ -1,6 +1,10 @@
-from app.database import init_db, engine
+from app.database import init_db, engine, SessionLocal
 from app.config import settings
+from app import schemas
+from app.models import Base
 from sqlalchemy import text
+import argparse
+import json
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -19,8 +23,40 @@ def reset_sequences():
     except Exception as e:
         logger.error(f"Error resetting sequences: {e}")
 
+def seed_tools(path: str):
+    """Load tools from a JSON file into PostgreSQL and Qdrant"""
+    # Only the seed path needs the embedding model and Qdrant
+    from app import crud
+    from app.vector_db import bulk_upsert_tools, disable_indexing, enable_indexing
+
+    with open(path) as f:
+        tools = json.load(f)
+
+    db = SessionLocal()
+    try:
+        db_tools = crud.bulk_create_tools(db, [schemas.ToolCreate(**tool) for tool in tools])
+        items = [(t.id, t.name, t.description, t.tags) for t in db_tools]
+
+        # Embed and upload all tools in one batch, indexing once at the end
+        disable_indexing()
+        try:
+            if not bulk_upsert_tools(items, parallel=4):
+                logger.warning("Failed to upsert seeded tools to vector database")
+        finally:
+            enable_indexing()
+        logger.info(f"Seeded {len(db_tools)} tools from {path}")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Initialize the database")
+    parser.add_argument("--seed", metavar="PATH", help="JSON file with a list of tools to load")
+    args = parser.parse_args()
+
     logger.info("Initializing database...")
+    Base.metadata.drop_all(bind=engine)
     init_db()
     reset_sequences()
-    logger.info("Database initialization complete!")
\ No newline at end of file
+    if args.seed:
+        seed_tools(args.seed)
+    logger.info("Database initialization complete!")
@@ -0,0 +1,38 @@
+"""
+Export the sentence-transformers embedding model to ONNX for ONNX_MODEL_DIR.
+
+Requires: pip install optimum[onnxruntime]
+"""
+import argparse
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def export(model_name: str, output_dir: str, quantize: bool):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    logger.info(f"Exported {model_name} to {output_dir}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        model_path = os.path.join(output_dir, "model.onnx")
+        quantized_path = os.path.join(output_dir, "model_int8.onnx")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        os.replace(quantized_path, model_path)
+        logger.info("Quantized model weights to int8")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="Hugging Face model id")
+    parser.add_argument("--output", default="onnx_model", help="Directory to write model.onnx and tokenizer files")
+    parser.add_argument("--quantize", action="store_true", help="Apply dynamic int8 quantization")
+    args = parser.parse_args()
+
+    export(args.model, args.output, args.quantize)